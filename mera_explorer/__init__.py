@@ -5,6 +5,7 @@
 https://github.com/ThomasRieutord/mera-explorer
 """
 import os
+import re
 
 PACKAGE_DIRECTORY = os.path.split(__path__[0])[0]
 
@@ -33,17 +34,18 @@ NEURALLAM_VARIABLES = [  # Order matters
 # MERAROOTDIR = "/data/trieutord/MERA/grib-all" # Parent directory of all MERA GRIB files
 # MERACLIMDIR = "/data/trieutord/MERA/meraclim" # Directory where are stored climatology data (in particular the m05.grib)
 
+def _read_setting(key, text):
+    """Value of the line `key = "value"` in `text` (commented lines are ignored), None if absent"""
+    m = re.search(r'^\s*' + key + r'\s*=\s*"([^"]*)"', text, re.M)
+    return m.group(1) if m else None
+
 with open(os.path.join(PACKAGE_DIRECTORY, "local", "paths.txt"), "r") as f:
-    for l in f.readlines():
-        if "MERAROOTDIR" in l:
-            MERAROOTDIR = l.split('"')[1]
-        if "MERACLIMDIR" in l:
-            MERACLIMDIR = l.split('"')[1]
+    _paths = f.read()
+
+MERAROOTDIR = _read_setting("MERAROOTDIR", _paths)
+MERACLIMDIR = _read_setting("MERACLIMDIR", _paths)
 
 with open(os.path.join(PACKAGE_DIRECTORY, "pyproject.toml"), "r") as f:
-    for l in f.readlines():
-        if "version" in l:
-            __version__ = l.split('"')[1]
-            break
+    __version__ = _read_setting("version", f.read())
 
-del f, l, os
+del f, _paths
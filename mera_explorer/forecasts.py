@@ -40,20 +40,24 @@ Global docstring reviews:
     - 3 July 2024 (Thomas Rieutord)
 """
 import datetime as dt
+import functools
+import io
+import multiprocessing
 import time
 import os
 import warnings
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 
-import climetlab as cml
 import numpy as np
-import xarray as xr
 
 from mera_explorer import MERACLIMDIR, MERAROOTDIR, PACKAGE_DIRECTORY, NEURALLAM_VARIABLES, gribs, utils
 
 NEURALLAM_INFERENCE_OUTPUTS = os.path.join(os.environ["SCRATCH"], "neurallam-inference-outputs")
 DEFAULT_INFERENCEID = "aifc"
 SUBSAMPLING_STEP = 1
+FORCING_DTYPE = np.float32
 
 ss = lambda x: utils.subsample(x, SUBSAMPLING_STEP)
 
@@ -76,35 +80,51 @@ def get_path_from_times(basetime, leadtime, inferenceid=DEFAULT_INFERENCEID) ->
     Example
     -------
     >>> get_path_from_times("2014-05-12", "30h")
-    '/data/trieutord/scratch/neural-lam-outputs/aifc/2014/05/12/00/mbr000/aifc2014120500+030.grib'
+    '/data/trieutord/scratch/neural-lam-outputs/aifc/2014/05/12/00/mbr000/aifc2014051200+030.grib'
     """
-    basetime = utils.str_to_datetime(basetime)
-    leadtime = utils.str_to_timedelta(leadtime)
-    strldt = str(int(leadtime.total_seconds() // 3600)).zfill(3)
-    return os.path.join(
-        NEURALLAM_INFERENCE_OUTPUTS,
+    return _get_path_from_times(
+        utils.str_to_datetime(basetime),
+        utils.str_to_timedelta(leadtime),
         inferenceid,
-        *[
-            str(_).zfill(2)
-            for _ in [
-                basetime.year,
-                basetime.month,
-                basetime.day,
-                basetime.hour,
-            ]
-        ],
-        "mbr000",
-        inferenceid + basetime.strftime("%Y%m%d%H") + f"+{strldt}.grib",
+        NEURALLAM_INFERENCE_OUTPUTS,
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_path_from_times(basetime, leadtime, inferenceid, rootdir) -> str:
+    """Memoized core of `get_path_from_times`, on already parsed times.
+
+    The same paths are requested many times for a given base time (analysis,
+    forcings, borders, forecast writing). The root directory is part of the key
+    because `NEURALLAM_INFERENCE_OUTPUTS` can be changed at runtime.
+    """
+    return _get_path_prefix(basetime, inferenceid, rootdir) + _get_path_suffix(leadtime)
+
+
+def _get_path_prefix(basetime, inferenceid, rootdir) -> str:
+    """Part of the path given by `get_path_from_times` that depends only on the base time"""
+    sep = os.sep
+    return (
+        f"{rootdir}{sep}{inferenceid}{sep}"
+        f"{basetime:%Y}{sep}{basetime:%m}{sep}{basetime:%d}{sep}{basetime:%H}{sep}"
+        f"mbr000{sep}{inferenceid}{basetime:%Y%m%d%H}"
     )
 
 
+def _get_path_suffix(leadtime) -> str:
+    """Part of the path given by `get_path_from_times` that depends only on the lead time"""
+    strldt = str(int(leadtime.total_seconds() // 3600)).zfill(3)
+    return f"+{strldt}.grib"
+
+
 def get_all_paths_from_times(
     basetimes, leadtimes, inferenceid=DEFAULT_INFERENCEID
 ) -> list:
     """Array-like equivalent of `get_path_from_times`
 
-    Each file path is generated by calling the `get_path_from_times`
-    function with a base time and lead time, and the inference ID.
+    Each file path is the same as `get_path_from_times` called with a base
+    time, a lead time and the inference ID. The part of the path depending
+    on the base time is computed only once per base time.
 
 
     Parameters
@@ -125,10 +145,14 @@ def get_all_paths_from_times(
     paths: list of str
         The corresponding list of file paths. Its length is equal to `len(basetimes)*len(leadtimes)`
     """
+    # The date formatting is done once per base time and once per lead time
+    suffixes = [_get_path_suffix(utils.str_to_timedelta(_)) for _ in leadtimes]
     paths = []
     for basetime in basetimes:
-        for leadtime in leadtimes:
-            paths.append(get_path_from_times(basetime, leadtime, inferenceid))
+        prefix = _get_path_prefix(
+            utils.str_to_datetime(basetime), inferenceid, NEURALLAM_INFERENCE_OUTPUTS
+        )
+        paths.extend([prefix + suffix for suffix in suffixes])
 
     return paths
 
@@ -167,13 +191,66 @@ def get_times_from_gribname(gribname) -> tuple:
         )
 
     p = gribname.index("+")
-    basetime = dt.datetime.strptime(gribname[p - 10 : p], "%Y%m%d%H")
+    # Fixed %Y%m%d%H format: slicing is much cheaper than strptime
+    s = gribname[p - 10 : p]
+    basetime = dt.datetime(int(s[0:4]), int(s[4:6]), int(s[6:8]), int(s[8:10]))
     leadtime = dt.timedelta(hours=int(gribname[p + 1 : p + 4]))
     valtime = basetime + leadtime
     return valtime, basetime, leadtime
 
 
-def write_in_grib(data, template_file, outgribname):
+@functools.lru_cache(maxsize=64)
+def _load_grib_source(gribname):
+    """Return the climetlab source of a MERA GRIB file.
+
+    MERA files are monthly, so the same file is used for many lead times
+    and consecutive base times. The most recent ones are kept open.
+    """
+    import climetlab as cml
+
+    return cml.load_source("file", gribname)
+
+
+def _load_grib_index(gribname) -> dict:
+    """Return the index of the messages of a MERA GRIB file (see `gribs.index_grib_messages`).
+
+    Like the sources, the indexes of the monthly files are kept across base
+    times. They are read again if the file is modified.
+    """
+    st = os.stat(gribname)
+    return _load_grib_index_cached(gribname, st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=64)
+def _load_grib_index_cached(gribname, mtime_ns, size) -> dict:
+    """Cached body of `_load_grib_index` (`mtime_ns` and `size` are only part of the cache key)"""
+    return gribs.index_grib_messages(gribname)
+
+
+@functools.lru_cache(maxsize=1)
+def _load_grib_template(template_file) -> list:
+    """Return the list of GRIB fields of a template file.
+
+    `write_forecast` uses the same template for all the lead times of a
+    forecast, so the last template read is kept in memory.
+    """
+    import climetlab as cml
+
+    return list(cml.load_source("file", template_file))
+
+
+def _encode_grib_message(values, template, step) -> bytes:
+    """Encode a single GRIB message from a climetlab template field"""
+    import climetlab as cml
+
+    message = io.BytesIO()
+    with cml.new_grib_output(message, template=template, step=step) as output:
+        output.write(values)
+
+    return message.getvalue()
+
+
+def write_in_grib(data, template_file, outgribname, n_workers=1):
     """Writes data into a GRIB file.
 
 
@@ -187,6 +264,11 @@ def write_in_grib(data, template_file, outgribname):
 
     outgribname: str
         The path of the GRIB file to be written.
+    
+    n_workers: int, optional
+        Number of threads encoding the variables concurrently (eccodes
+        releases the GIL). Messages are written in the order of `data`.
+        Default is 1.
 
 
     Returns
@@ -200,29 +282,20 @@ def write_in_grib(data, template_file, outgribname):
         - The function assumes that the data dictionary contains the CF names as keys and the corresponding data as values.
         - The function assumes that the template file contains the template for each CF name.
         - The function assumes that the output GRIB file name is provided in the format expected by the `get_times_from_gribname` function.
-        - The function assumes that the `cml` module is imported and available.
-        - The function assumes that the `os` module is imported and available.
     """
-    template = cml.load_source("file", template_file)
+    template = _load_grib_template(template_file)
     cfnames = data.keys()
     _, _, leadtime = get_times_from_gribname(outgribname)
     ldt = int(leadtime.total_seconds() / 3600)
 
-    for i, (onevarfield, cfname) in enumerate(zip(template, cfnames)):
-        with cml.new_grib_output(
-            outgribname.replace(".grib", f".{cfname}.grib"),
-            template=onevarfield,
-            step=ldt,
-        ) as output:
-            output.write(data[cfname])
+    # All messages are appended to the same file (no temporary file per variable)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor, open(outgribname, "wb") as f:
+        messages = executor.map(
+            _encode_grib_message, [data[cfname] for cfname in cfnames], template, repeat(ldt)
+        )
+        for message in messages:
+            f.write(message)
 
-    griblist = " ".join(
-        [outgribname.replace(".grib", f".{cfname}.grib") for cfname in cfnames]
-    )
-    cat_cmd = f"cat {griblist} > {outgribname}"
-    rm_cmd = f"rm {griblist}"
-    os.system(cat_cmd)
-    os.system(rm_cmd)
     return outgribname
 
 
@@ -252,12 +325,11 @@ def concatenate_states(states) -> np.ndarray:
     nv = len(states[0].keys())
     key = list(states[0].keys())[0]
     nx, ny = states[0][key].shape
-    concat_states = np.zeros((nt, nx * ny, nv))
+    concat_states = np.empty((nt, nx, ny, nv), dtype=states[0][key].dtype)
     for i_t, state in enumerate(states):  # len(states) = nt
-        for i_v, key in enumerate(state.keys()):  # len(state.keys) = nv
-            concat_states[i_t, :, i_v] = state[key].ravel()  # (nx, ny)
+        np.stack(list(state.values()), axis=-1, out=concat_states[i_t])  # (nx, ny, nv)
 
-    return concat_states  # (nt, nx*ny, nv)
+    return concat_states.reshape((nt, nx * ny, nv))  # (nt, nx*ny, nv)
 
 
 def separate_states(state, cfnames, gridshape) -> list:
@@ -296,16 +368,22 @@ def separate_states(state, cfnames, gridshape) -> list:
     ), "The list of variables does not match the number of dimensions"
     assert (
         n_grid == gridshape[0] * gridshape[1]
-    ), "Unable to reshape {n_grid} elements in {gridshape}"
+    ), f"Unable to reshape {n_grid} elements in {gridshape}"
 
-    return [
-        OrderedDict([(cfnames[iv], state[it, :, iv].reshape(gridshape)) for iv in range(nv)])
-        for it in range(nt)
-    ]
+    # One bulk copy so that each field is a contiguous (nx, ny) array
+    fields = np.ascontiguousarray(
+        state.reshape((nt, *gridshape, nv)).transpose(0, 3, 1, 2)
+    )  # (nt, nv, nx, ny)
+    return [OrderedDict(zip(cfnames, fields[it])) for it in range(nt)]
+
+
+def _read_and_encode_message(gribname, offset, size, template, step) -> bytes:
+    """Decode one message of a MERA file and encode it again with the given template"""
+    return _encode_grib_message(gribs.read_grib_message(gribname, offset, size), template, step)
 
 
 def create_analysis(
-    basetime, cfnames, max_leadtime, inferenceid, step=dt.timedelta(hours=3), overwrite = False
+    basetime, cfnames, max_leadtime, inferenceid, step=dt.timedelta(hours=3), overwrite = False, n_workers = 1
 ) -> str:
     """Create analysis files based on the given parameters.
 
@@ -326,6 +404,10 @@ def create_analysis(
     
     step: dt.timedelta or str
         Time step between each lead time
+    
+    n_workers: int, optional
+        Number of threads reading and encoding the variables of each file
+        concurrently (eccodes releases the GIL). Default is 1.
 
 
     Returns
@@ -337,12 +419,12 @@ def create_analysis(
     max_leadtime = utils.str_to_timedelta(max_leadtime)
     step = utils.str_to_timedelta(step)
 
+    all_leadtimes = [i_ldt * step for i_ldt in range(-1, max_leadtime // step + 1)]
+    all_outgribnames = get_all_paths_from_times([basetime], all_leadtimes, inferenceid)
+
     leadtimes = []
     outgribnames = []
-    for i_ldt in range(-1, max_leadtime // step + 1):
-        leadtime = i_ldt * step
-        outgribname = get_path_from_times(basetime, leadtime, inferenceid)
-        
+    for leadtime, outgribname in zip(all_leadtimes, all_outgribnames):
         if os.path.isfile(outgribname) and not overwrite:
             print(f"Forecast file {outgribname} already existing. Skipped")
             continue
@@ -350,46 +432,83 @@ def create_analysis(
         leadtimes.append(leadtime)
         outgribnames.append(outgribname)
 
-    for outgribname, leadtime in zip(outgribnames, leadtimes):
-        os.makedirs(os.path.dirname(outgribname), exist_ok=True)
-        valtime = basetime + leadtime
-        ldt = int(leadtime.total_seconds() / 3600)
-        if ldt < 0:
-            # Workaround the second previous state (ldt=-3)
-            ldt = 0
-        
-        for cfname in cfnames:
-            gribname = os.path.join(
-                MERAROOTDIR,
-                gribs.get_mera_gribname_valtime(cfname, valtime, pathfromroot=True),
-            )
-
-            if not os.path.isfile(gribname):
-                print(f"\t\tMISSING: {cfname} {gribname}")
-                continue
+    # Variable-dependent part of the MERA GRIB names, resolved once for all lead times
+    gribtemplates = {
+        cfname: gribs.get_mera_gribname_valtime_template(cfname, pathfromroot=True)
+        for cfname in cfnames
+    }
+    gribnames = {
+        (cfname, leadtime): os.path.join(
+            MERAROOTDIR, gribtemplate.format(basetime=basetime + leadtime - timeshift)
+        )
+        for leadtime in leadtimes
+        for cfname, (gribtemplate, timeshift) in gribtemplates.items()
+    }
+    
+    # Index all the MERA files needed for this base time at once, overlapping the reads
+    # (MERA GRIBs are monthly: the same file is used for many lead times)
+    present_gribnames = sorted(
+        set(gribname for gribname in gribnames.values() if os.path.isfile(gribname))
+    )
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        indexes = dict(
+            zip(present_gribnames, executor.map(_load_grib_index, present_gribnames))
+        )
+    
+    # All lead times of a base time are in the same directory
+    os.makedirs(os.path.dirname(all_outgribnames[0]), exist_ok=True)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for outgribname, leadtime in zip(outgribnames, leadtimes):
+            valtime = basetime + leadtime
+            ldt = int(leadtime.total_seconds() / 3600)
+            if ldt < 0:
+                # Workaround the second previous state (ldt=-3)
+                ldt = 0
+            
+            # Messages to extract (each variable comes from its own MERA file and template)
+            tasks = []
+            for cfname in cfnames:
+                _, timeshift = gribtemplates[cfname]
+                gribname = gribnames[(cfname, leadtime)]
+
+                if gribname not in indexes:
+                    print(f"\t\tMISSING: {cfname} {gribname}")
+                    continue
+
+                offset, size = indexes[gribname][
+                    (valtime - timeshift, int(timeshift.total_seconds() // 3600))
+                ]
+                for template in _load_grib_source(gribname):
+                    # Look for the GRIB field with the correct base time
+                    if gribs.get_climetlab_basetime(template) == basetime:
+                        break
+                
+                tasks.append((gribname, offset, size, template))
+
+            # Messages are encoded in memory, then the file is written in one go (in the order of `cfnames`)
+            messages = executor.map(lambda task: _read_and_encode_message(*task, ldt), tasks)
+            with open(outgribname, "wb") as f:
+                for message in messages:
+                    f.write(message)
 
-            x = gribs.get_data(gribname, valtime)
+    return outgribnames
 
-            src = cml.load_source("file", gribname)
-            for template in src:
-                # Look for the GRIB field with the correct base time
-                if gribs.get_climetlab_basetime(template) == basetime:
-                    break
 
-            with cml.new_grib_output(
-                outgribname.replace(".grib", f".{cfname}.grib"), template=template, step = ldt
-            ) as output:
-                output.write(x)
+@functools.lru_cache(maxsize=1)
+def get_land_sea_mask() -> np.ndarray:
+    """Return the MERA land-sea mask, read from the climatology file m05.grib.
 
-        griblist = " ".join(
-            [outgribname.replace(".grib", f".{cfname}.grib") for cfname in cfnames]
+    The mask is static, so it is read only once per process and then cached.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        # SerializationWarning: Unable to decode time axis into full numpy.datetime64 objects, continuing using cftime.datetime objects instead, reason: dates out of range
+        sfx = gribs.open_dataset(
+            os.path.join(MERACLIMDIR, "m05.grib"),
+            filter_by_keys={"typeOfLevel": "heightAboveGround"},
         )
-        cat_cmd = f"\t cat {griblist} > {outgribname}"
-        rm_cmd = f"\t rm {griblist}"
-        os.system(cat_cmd)
-        os.system(rm_cmd)
 
-    return outgribnames
+    return sfx.lsm.to_numpy()
 
 
 def create_forcings(basetime, max_leadtime, inferenceid, step=dt.timedelta(hours=3), overwrite = False) -> str:
@@ -416,6 +535,8 @@ def create_forcings(basetime, max_leadtime, inferenceid, step=dt.timedelta(hours
     forcings_file: str
         The path to the file created, containing the data for the forcings
     """
+    import xarray as xr
+
     toaswf_cfname = "toa_incoming_shortwave_flux"
     basetime = utils.str_to_datetime(basetime)
     max_leadtime = utils.str_to_timedelta(max_leadtime)
@@ -436,37 +557,29 @@ def create_forcings(basetime, max_leadtime, inferenceid, step=dt.timedelta(hours
     os.makedirs(outdir, exist_ok=True)
     
     # TOA files
-    count = 0
-    for valtime in valtimes:
+    gribtemplate, timeshift = gribs.get_mera_gribname_valtime_template(
+        toaswf_cfname, pathfromroot=True
+    )
+    # MERA files are monthly: each file is opened once for all its validity times
+    i_t_per_gribname = {}
+    for i_t, valtime in enumerate(valtimes):
         gribname = os.path.join(
-            MERAROOTDIR,
-            gribs.get_mera_gribname_valtime(toaswf_cfname, valtime, pathfromroot=True),
+            MERAROOTDIR, gribtemplate.format(basetime=valtime - timeshift)
         )
-        if count == 0:
-            toaswf = gribs.get_data(gribname, valtime)
-        else:
-            x_t = gribs.get_data(gribname, valtime)
-            toaswf = np.dstack((toaswf, x_t))
-
-        count += 1
-
-    toaswf = np.swapaxes(toaswf, 0, 2)
-    toaswf = np.swapaxes(toaswf, 1, 2)
+        i_t_per_gribname.setdefault(gribname, []).append(i_t)
+    
+    # The reads stay sequential: the cfgrib backend of xarray is not thread-safe
+    toaswf = None
+    for gribname, i_ts in i_t_per_gribname.items():
+        x = gribs.get_data(gribname, np.array([valtimes[i_t] for i_t in i_ts]))  # (len(i_ts), nx, ny)
+        if toaswf is None:
+            # Allocate once the grid shape is known, then fill in place
+            toaswf = np.empty((len(valtimes), *x.shape[1:]), dtype=FORCING_DTYPE)
+        
+        toaswf[i_ts] = x  # (nt, nx, ny)
 
     # WRT files
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        # SerializationWarning: Unable to decode time axis into full numpy.datetime64 objects, continuing using cftime.datetime objects instead, reason: dates out of range
-        sfx = xr.open_dataset(
-            os.path.join(MERACLIMDIR, "m05.grib"),
-            engine="cfgrib",
-            filter_by_keys={"typeOfLevel": "heightAboveGround"},
-            backend_kwargs={
-                "indexpath": os.path.join(gribs.INDEX_PATH, "m05.grib.idx")
-            },
-        )
-
-    lsm = sfx.lsm.to_numpy()
+    lsm = get_land_sea_mask()
 
     nt, nx, ny = toaswf.shape
     ds = xr.Dataset(
@@ -477,16 +590,40 @@ def create_forcings(basetime, max_leadtime, inferenceid, step=dt.timedelta(hours
         coords={
             "x": range(nx),
             "y": range(ny),
-            "t": valtimes,
+            "t": np.array(valtimes, dtype="datetime64[ns]"),
+        },
+    )
+    # One chunk per time step, compressed with fast (level 1) deflate
+    ds.to_netcdf(
+        forcings_file,
+        encoding={
+            toaswf_cfname: {"zlib": True, "complevel": 1, "chunksizes": (1, nx, ny)},
+            "land_sea_mask": {"zlib": True, "complevel": 1, "chunksizes": (nx, ny)},
         },
     )
-    ds.to_netcdf(forcings_file)
 
     return forcings_file
 
 
+def _create_analysis_and_forcings_one_basetime(
+    basetime, cfnames, max_leadtime, inferenceid, step, overwrite, n_workers = 1
+) -> str:
+    """Create the forcings and analysis files for a single base time.
+
+    Defined at module level so it can be sent to worker processes
+    (see `create_mera_analysis_and_forcings`).
+    """
+    forcings_file = create_forcings(
+        basetime, max_leadtime=max_leadtime, inferenceid=inferenceid, step=step, overwrite=overwrite
+    )
+    create_analysis(
+        basetime, cfnames, max_leadtime=max_leadtime, inferenceid=inferenceid, step=step, overwrite=overwrite, n_workers=n_workers
+    )
+    return forcings_file
+
+
 def create_mera_analysis_and_forcings(
-    startdate, enddate, max_leadtime="54h", textract="72h", step="3h", overwrite = False
+    startdate, enddate, max_leadtime="54h", textract="72h", step="3h", overwrite = False, n_workers = 1
 ) -> None:
     """Main function #1
 
@@ -512,6 +649,13 @@ def create_mera_analysis_and_forcings(
     
     step: dt.timedelta or str
         Time step between each lead time
+    
+    n_workers: int, optional
+        Number of workers used to write the base times in parallel.
+        Base times are independent from each other, so they are dispatched
+        to a process pool when `n_workers > 1`. When there are fewer base times
+        than workers, the rest of the budget goes to the threads of `create_analysis`.
+        Default is 1 (sequential).
 
 
     Example
@@ -536,16 +680,41 @@ def create_mera_analysis_and_forcings(
         f"Writing {len(basetimes) * (max_leadtime//step + 3)} files from MERA in {NEURALLAM_INFERENCE_OUTPUTS}"
     )
 
-    for i_bt, basetime in enumerate(basetimes):
-        forcings_file = create_forcings(
-            basetime, max_leadtime=max_leadtime, inferenceid="mera", step=step, overwrite=overwrite
-        )
-        create_analysis(
-            basetime, NEURALLAM_VARIABLES, max_leadtime=max_leadtime, inferenceid="mera", step=step, overwrite=overwrite
-        )
-        print(
-            f"[{i_bt}/{len(basetimes)}] Basetime {basetime} written in {os.path.dirname(forcings_file)}"
+    n_processes = max(1, min(n_workers, len(basetimes)))
+    n_threads = max(1, n_workers // n_processes)
+    args = (
+        basetimes,
+        repeat(NEURALLAM_VARIABLES),
+        repeat(max_leadtime),
+        repeat("mera"),
+        repeat(step),
+        repeat(overwrite),
+        repeat(n_threads),
+    )
+    if n_processes > 1:
+        # Fork so that workers inherit module-level settings changed at runtime
+        # (e.g. `NEURALLAM_INFERENCE_OUTPUTS` in write_gribs_for_neurallam_init.py)
+        executor = ProcessPoolExecutor(
+            max_workers=n_processes, mp_context=multiprocessing.get_context("fork")
         )
+        forcings_files = executor.map(_create_analysis_and_forcings_one_basetime, *args)
+    else:
+        executor = None
+        forcings_files = map(_create_analysis_and_forcings_one_basetime, *args)
+    
+    try:
+        for i_bt, (basetime, forcings_file) in enumerate(zip(basetimes, forcings_files)):
+            print(
+                f"[{i_bt}/{len(basetimes)}] Basetime {basetime} written in {os.path.dirname(forcings_file)}"
+            )
+    except BaseException:
+        if executor is not None:
+            # Report the error without processing the base times still pending
+            executor.shutdown(cancel_futures=True)
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
     stop = time.time()
     print(f"Total elapsed time: {round(stop-start, 1)} s. Average of {round((stop-start)/i_bt, 4)} s per basetime")
@@ -561,7 +730,7 @@ def get_datetime_forcing(datetimes, n_grid=None) -> np.ndarray:
 
     Parameters
     ----------
-    datetimes: list of dt.datetime
+    datetimes: list of dt.datetime or array-like of np.datetime64
         List of `nt` datetimes objects for which we want the forcing
     
     n_grid: int or None, optional
@@ -574,28 +743,24 @@ def get_datetime_forcing(datetimes, n_grid=None) -> np.ndarray:
         The date and time component of the forcing. If `n_grid=None`, it has a
         shape `(4, nt)`, else it has a shape `(nt, n_grid, 4)`
     """
-    start_of_year = dt.datetime(datetimes[0].year, 1, 1)
-    seconds_into_year = np.array(
-        [(_ - start_of_year).total_seconds() for _ in datetimes]
-    )
-    year_angle = (seconds_into_year * 2 * np.pi) / (365 * 24 * 3600)
-    hours_into_day = np.array([_.hour for _ in datetimes])
-    hour_angle = (hours_into_day * 2 * np.pi) / 24
-    datetime_forcing = np.stack(
-        [
-            np.sin(hour_angle),
-            np.cos(hour_angle),
-            np.sin(year_angle),
-            np.cos(year_angle),
-        ]
-    ) # (nf=4, nt)
+    datetimes = np.asarray(datetimes, dtype="datetime64[s]")
+    start_of_year = datetimes[0].astype("datetime64[Y]")
+    seconds_into_year = (datetimes - start_of_year).astype(np.float64)
+    year_angle = ((seconds_into_year * 2 * np.pi) / (365 * 24 * 3600)).astype(FORCING_DTYPE)
+    hours_into_day = (
+        datetimes.astype("datetime64[h]") - datetimes.astype("datetime64[D]")
+    ).astype(np.float64)
+    hour_angle = ((hours_into_day * 2 * np.pi) / 24).astype(FORCING_DTYPE)
+    nt = datetimes.size
+    datetime_forcing = np.empty((4, nt), dtype=FORCING_DTYPE) # (nf=4, nt)
+    np.sin(hour_angle, out=datetime_forcing[0])
+    np.cos(hour_angle, out=datetime_forcing[1])
+    np.sin(year_angle, out=datetime_forcing[2])
+    np.cos(year_angle, out=datetime_forcing[3])
     if n_grid is not None:
-        nf, nt = datetime_forcing.shape
+        # Constant over the grid: a broadcast view, materialised by the caller's concatenation
         datetime_forcing = np.broadcast_to(
-            datetime_forcing, (n_grid, nf, nt)
-        )  # (n_grid, nf, nt)
-        datetime_forcing = np.moveaxis(
-            datetime_forcing, (0, 1, 2), (1, 2, 0)
+            datetime_forcing.T[:, np.newaxis, :], (nt, n_grid, 4)
         )  # (nt, n_grid, nf)
 
     return datetime_forcing
@@ -632,6 +797,10 @@ def get_analysis(basetime, concat=True, data_scaler = None) -> np.ndarray:
         
         states = concatenate_states([curr_state, prev_state])
         states = data_scaler.transform(states)
+        if concat:
+            # Already concatenated: no need to separate and concatenate again
+            return states
+        
         curr_state, prev_state = separate_states(states, NEURALLAM_VARIABLES, gridshape)
         
     if concat:
@@ -659,6 +828,8 @@ def get_forcings(basetime, flux_scaler = None) -> np.ndarray:
     forcing: np.ndarray of shape (nt - 2, n_grid, 16)
         The forcing for the forecast as needed in Neural-LAM
     """
+    import xarray as xr
+
     indir = os.path.dirname(get_path_from_times(basetime, "0h", "mera"))
     forcings_file = os.path.join(
         indir, "forcings" + basetime.strftime("%Y%m%d%H") + ".nc"
@@ -673,39 +844,50 @@ def get_forcings(basetime, flux_scaler = None) -> np.ndarray:
     if flux_scaler is not None:
         flux = flux_scaler.transform(flux)
     
+    flux = flux.astype(FORCING_DTYPE, copy=False)
     nt, nx, ny = flux.shape
     flux = flux.reshape(nt, nx * ny, 1)
 
     datetime_forcing = get_datetime_forcing(
-        [utils.datetime_from_npdatetime(_) for _ in forcing_data.t.values],
+        forcing_data.t.values,
         n_grid=nx * ny,
     )
     forcing_features = np.concatenate(
         [flux, datetime_forcing], axis=-1
     )  # (nt, n_grid, 5)
-    forcing_windowed = np.concatenate(
-        [
-            forcing_features[:-2],
-            forcing_features[1:-1],
-            forcing_features[2:],
-        ],
-        axis=-1,
-    )  # (nt - 2, n_grid, 15)
+    # Features at (t-1, t, t+1) side by side, from a zero-copy sliding window
+    forcing_windowed = np.lib.stride_tricks.sliding_window_view(
+        forcing_features, 3, axis=0
+    )  # (nt - 2, n_grid, 5, 3)
 
     lsm = forcing_data.land_sea_mask.values
     
     if SUBSAMPLING_STEP > 1:
         lsm = ss(lsm)
     
-    lsm = np.broadcast_to(lsm.ravel(), (nt - 2, nx * ny)).reshape(
-        (nt - 2, nx * ny, 1)
-    )  # (nt - 2, n_grid, 1)
-
-    forcing = np.concatenate([forcing_windowed, lsm], axis=-1)
+    # Each part is written once into the output (the LSM is broadcast along time)
+    forcing = np.empty((nt - 2, nx * ny, 16), dtype=FORCING_DTYPE)
+    for k in range(3):
+        forcing[..., 5 * k : 5 * (k + 1)] = forcing_windowed[..., k]  # (nt - 2, n_grid, 5)
+    
+    forcing[..., 15] = lsm.reshape(1, nx * ny)  # (nt - 2, n_grid)
     return forcing  # (nt - 2, n_grid, 16)
 
 
-def get_borders(basetime, max_leadtime, step=dt.timedelta(hours=3), concat=True, data_scaler = None) -> np.ndarray:
+def _read_border_state(gribname) -> OrderedDict:
+    """Read one MERA state used as border, in the Neural-LAM variable order"""
+    state = gribs.read_multimessage_grib(gribname)
+    
+    # Re-order variables (fix for analysis writing with wrong order)
+    state = OrderedDict([(k,state[k]) for k in NEURALLAM_VARIABLES])
+    
+    if SUBSAMPLING_STEP > 1:
+        state = OrderedDict([(k,ss(v)) for k,v in state.items()])
+    
+    return state
+
+
+def get_borders(basetime, max_leadtime, step=dt.timedelta(hours=3), concat=True, data_scaler = None, n_workers = 1) -> np.ndarray:
     """Calculate the forcings for a forecast starting at `basetime`.
     
     For a given datetime, the forcing is a 4-dimensional vector accounting for variations
@@ -727,6 +909,11 @@ def get_borders(basetime, max_leadtime, step=dt.timedelta(hours=3), concat=True,
     concat: bool, optional
         If True, the data is concatenated into a single array where the
         geographical grid is flattened (see `concatenate_states`)
+    
+    n_workers: int, optional
+        Number of threads reading the GRIB files concurrently (eccodes
+        releases the GIL). States are returned in the order of lead times.
+        Default is 1.
 
     Returns
     -------
@@ -735,25 +922,22 @@ def get_borders(basetime, max_leadtime, step=dt.timedelta(hours=3), concat=True,
     """
     step = utils.str_to_timedelta(step)
     max_leadtime = utils.str_to_timedelta(max_leadtime)
-    states = []
-    for i_ldt in range(1, max_leadtime // step + 1):
-        leadtime = i_ldt * step
-        gribname = get_path_from_times(basetime, leadtime, "mera")
-        state = gribs.read_multimessage_grib(gribname)
-        
-        # Re-order variables (fix for analysis writing with wrong order)
-        state = OrderedDict([(k,state[k]) for k in NEURALLAM_VARIABLES])
-        
-        if SUBSAMPLING_STEP > 1:
-            state = OrderedDict([(k,ss(v)) for k,v in state.items()])
-        
-        states.append(state)
+    gribnames = [
+        get_path_from_times(basetime, i_ldt * step, "mera")
+        for i_ldt in range(1, max_leadtime // step + 1)
+    ]
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        states = list(executor.map(_read_border_state, gribnames))
 
     if data_scaler is not None:
         gridshape = states[0][NEURALLAM_VARIABLES[0]].shape
         
         states = concatenate_states(states)
         states = data_scaler.transform(states)
+        if concat:
+            # Already concatenated: no need to separate and concatenate again
+            return states
+        
         states = separate_states(states, NEURALLAM_VARIABLES, gridshape)
     
     if concat:
@@ -762,8 +946,19 @@ def get_borders(basetime, max_leadtime, step=dt.timedelta(hours=3), concat=True,
         return states
 
 
+def _read_forecast_inputs(basetime, max_leadtime, forecaster, n_workers = 1) -> tuple:
+    """Return the (analysis, forcings, borders) of a forecast starting at `basetime`
+    
+    `n_workers` threads read the border files (see `get_borders`).
+    """
+    analysis = get_analysis(basetime, data_scaler = forecaster.data_scaler)
+    forcings = get_forcings(basetime, flux_scaler = forecaster.flux_scaler)
+    borders = get_borders(basetime, max_leadtime, data_scaler = forecaster.data_scaler, n_workers = n_workers)
+    return analysis, forcings, borders
+
+
 def forecast_from_analysis_and_forcings(
-    startdate, enddate, forecaster, max_leadtime="54h", textract="72h", step="3h"
+    startdate, enddate, forecaster, max_leadtime="54h", textract="72h", step="3h", n_workers = 1
 ) -> None:
     """Main function #2.
 
@@ -794,6 +989,16 @@ def forecast_from_analysis_and_forcings(
     
     step: dt.timedelta or str
         Time step between each lead time
+    
+    n_workers: int, optional
+        Number of threads doing the I/O (reading the borders, encoding the GRIB
+        messages). When `n_workers > 1`, the inputs of the
+        next base time are read and the previous forecast is written while the
+        forecaster runs (the forecaster itself is always called from the main thread).
+        The inputs of two base times are then held in memory at once, and the data
+        scaler is used from two threads at the same time (`transform` when reading,
+        `inverse_transform` in the main thread): it must be thread-safe.
+        Default is 1 (sequential).
 
 
     Example
@@ -820,24 +1025,52 @@ def forecast_from_analysis_and_forcings(
         f"Writing {len(basetimes) * (max_leadtime//step + 1)} forecast files with {forecaster.shortname} in {NEURALLAM_INFERENCE_OUTPUTS}"
     )
 
-    for i_bt, basetime in enumerate(basetimes):
-        analysis = get_analysis(basetime, data_scaler = forecaster.data_scaler)
-        forcings = get_forcings(basetime, flux_scaler = forecaster.flux_scaler)
-        borders = get_borders(basetime, max_leadtime, data_scaler = forecaster.data_scaler)
-        forecast = forecaster.forecast(analysis, forcings, borders)
-        forecast = forecaster.data_scaler.inverse_transform(forecast)
-        forecast_files = write_forecast(
-            forecast, basetime, inferenceid=forecaster.shortname, variables_to_write=NEURALLAM_VARIABLES, step=step
-        )
+    def report(i_bt, basetime, forecast_files):
         print(
             f"[{i_bt}/{len(basetimes)}] Forecast from {forecaster.shortname} at basetime {basetime} written in {os.path.dirname(forecast_files[0])}"
         )
+    
+    if n_workers <= 1:
+        for i_bt, basetime in enumerate(basetimes):
+            analysis, forcings, borders = _read_forecast_inputs(basetime, max_leadtime, forecaster)
+            forecast = forecaster.forecast(analysis, forcings, borders)
+            forecast = forecaster.data_scaler.inverse_transform(forecast)
+            forecast_files = write_forecast(
+                forecast, basetime, inferenceid=forecaster.shortname, variables_to_write=NEURALLAM_VARIABLES, step=step
+            )
+            report(i_bt, basetime, forecast_files)
+    else:
+        # Pipeline: read (base time i+1) | forecast (base time i) | write (base time i-1)
+        # The threads are shared between the reading and the writing, running at the same time
+        io_workers = max(1, n_workers // 2)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            reading = executor.submit(_read_forecast_inputs, basetimes[0], max_leadtime, forecaster, io_workers)
+            previous = None
+            for i_bt, basetime in enumerate(basetimes):
+                analysis, forcings, borders = reading.result()
+                if i_bt + 1 < len(basetimes):
+                    reading = executor.submit(
+                        _read_forecast_inputs, basetimes[i_bt + 1], max_leadtime, forecaster, io_workers
+                    )
+                
+                forecast = forecaster.forecast(analysis, forcings, borders)
+                forecast = forecaster.data_scaler.inverse_transform(forecast)
+                
+                if previous is not None:
+                    report(previous[0], previous[1], previous[2].result())
+                
+                writing = executor.submit(
+                    write_forecast, forecast, basetime, inferenceid=forecaster.shortname, variables_to_write=NEURALLAM_VARIABLES, step=step, n_workers=io_workers
+                )
+                previous = (i_bt, basetime, writing)
+            
+            report(previous[0], previous[1], previous[2].result())
 
     stop = time.time()
     print(f"Total elapsed time: {round(stop-start, 1)} s. Average of {round((stop-start)/i_bt, 4)} s per basetime")
 
 def write_forecast(
-    forecast, basetime, inferenceid, variables_to_write="all", step="3h"
+    forecast, basetime, inferenceid, variables_to_write="all", step="3h", n_workers=1
 ) -> list:
     """Write the forecast values into GRIB files.
 
@@ -861,6 +1094,9 @@ def write_forecast(
 
     step: dt.timedelta or str
         Time step between each lead time
+    
+    n_workers: int, optional
+        Number of threads encoding the variables of each file (see `write_in_grib`)
 
 
     Returns
@@ -870,13 +1106,11 @@ def write_forecast(
     """
     step = utils.str_to_timedelta(step)
     grib_template = get_path_from_times(basetime, "0h", "mera")
-    data_template = gribs.read_multimessage_grib(grib_template)
-    
-    # Re-order variables (fix for analysis writing with wrong order)
-    data_template = OrderedDict([(k,data_template[k]) for k in NEURALLAM_VARIABLES])
     
-    cfnames = list(data_template.keys())
-    gridshape = data_template[cfnames[0]].shape
+    # The forecast variables are in the Neural-LAM order (fix for analysis writing with wrong order).
+    # The grid shape is read from the template headers, without decoding the fields.
+    cfnames = list(NEURALLAM_VARIABLES)
+    gridshape = _load_grib_template(grib_template)[0].shape
 
     states = separate_states(forecast, cfnames, gridshape)
 
@@ -890,11 +1124,11 @@ def write_forecast(
         ]
 
     forecast_files = []
+    os.makedirs(os.path.dirname(get_path_from_times(basetime, step, inferenceid)), exist_ok=True)
     for i_ldt in range(len(states)):
         leadtime = step * (i_ldt + 1)
         outgribname = get_path_from_times(basetime, leadtime, inferenceid)
-        os.makedirs(os.path.dirname(outgribname), exist_ok=True)
-        write_in_grib(states[i_ldt], grib_template, outgribname)
+        write_in_grib(states[i_ldt], grib_template, outgribname, n_workers=n_workers)
         forecast_files.append(outgribname)
 
     return forecast_files
@@ -27,21 +27,32 @@ References
 
 import os
 import bz2
+import functools
 import yaml
 import shutil
 import numpy as np
 import datetime as dt
 import easydict
-import eccodes as ecc
-import epygram
-import xarray as xr
 from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from mera_explorer import utils, PACKAGE_DIRECTORY
 
+# The GRIB readers (eccodes, epygram, xarray) are slow to import: they are
+# imported in the functions using them, so that the rest of the module
+# (names, paths, GRIB1 codes) stays quick to load.
+
+# Use the C implementation of the YAML parser and emitter when libyaml is available
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
 # DATA
 # ====
 
-INDEX_PATH = os.path.expanduser("~/tmp") # Path where the .idx files will be stored (must be directory with writing rights)
+# Path where the .idx files will be stored (must be directory with writing rights).
+# Set MERA_IDX_DIR to put them on a faster local file system (e.g. /dev/shm).
+INDEX_PATH = os.environ.get("MERA_IDX_DIR", os.path.expanduser("~/tmp"))
 # Sources (2024/02/28):
 # 1- https://github.com/pydata/xarray/issues/6512
 # 2- https://github.com/ecmwf/cfgrib/issues/275
@@ -167,9 +178,9 @@ unit_to_itl = {
 itl_to_unit = {v:k for k,v in unit_to_itl.items()}
 itl_to_unit[103] = "sea_level"
 
-cfnames_without_at = [
+cfnames_without_at = {
     k for k,v in cfname_to_default_grib1id.items() if v[3] !=0 or v[1] == 200
-]
+}
 
 # FUNCTIONS
 # =========
@@ -205,14 +216,11 @@ def add_vlevel_to_fieldnames(lfn, lvlvl, vlvl_unit = "hPa"):
     >>> add_vlevel_to_fieldnames(["air_temperature", "wind_speed"], [10], "metres")
     >>> ["air_temperature_at_10_metres", "wind_speed_at_10_metres"]
     """
-    lfnv = []
-    for fd in lfn:
-        for vlvl in lvlvl:
-            lfnv.append(fd + "_" + "_".join(["at", str(vlvl), vlvl_unit]))
-    
-    return lfnv
+    return [f"{fd}_at_{vlvl}_{vlvl_unit}" for fd in lfn for vlvl in lvlvl]
 
 def check_grib(outgribname):
+    import eccodes as ecc
+
     with open(outgribname, 'rb') as fin:
         messages = []
         print(f"There are {ecc.codes_count_in_file(fin)} messages in {outgribname}")
@@ -234,6 +242,7 @@ def check_grib(outgribname):
             ecc.codes_keys_iterator_delete(iterid)
             ecc.codes_release(gid)
 
+@functools.lru_cache(maxsize=None)
 def get_grib1id_from_cfname(cfname):
     """Return the tuple (IOP, ITL, LEV, TRI) corresponding to the given CF standard name.
     
@@ -259,6 +268,9 @@ def get_grib1id_from_cfname(cfname):
     
     >>> get_grib1id_from_cfname("air_pressure_at_sea_level")
     >>> (1, 103, 0, 0)
+    
+    Results are memoized: the set of CF names used is small and the same
+    names are looked up many times (variable lists, gribname loops).
     """
     base_quantity = cfname.split("_at_")[0]
     iop, itl, lev, tri = cfname_to_default_grib1id[base_quantity]
@@ -278,6 +290,7 @@ def get_grib1id_from_cfname(cfname):
     
     return iop, itl, lev, tri
 
+@functools.lru_cache(maxsize=None)
 def get_cfname_from_grib1id(iop, itl, lev):
     base_quantity = iop_to_cfname[int(iop)]
     if base_quantity in cfnames_without_at:
@@ -297,7 +310,7 @@ def get_cfname_from_grib1id(iop, itl, lev):
 def get_date_from_gribname(gribname) -> dt.datetime:
     """Extract the date (1st of the month) from the GRIB name."""
     gribname = os.path.basename(gribname)
-    _, _, year, month, _, _, _, _, _ = gribname.split("_")
+    _, _, year, month, _ = gribname.split("_", 4)
     
     return dt.datetime(int(year), int(month), 1)
 
@@ -332,6 +345,25 @@ def get_climetlab_basetime(gribfield):
     time = gribfield.handle.get_string("time")
     return dt.datetime.strptime(date + time, "%Y%m%d%H%M")
 
+def open_dataset(gribname, **kwargs):
+    """Open a GRIB file with xarray (cfgrib engine), keeping its index in `INDEX_PATH`
+    
+    The index file is named after the GRIB file, so that it is re-used
+    the next time the same file is opened instead of being rebuilt.
+    Keyword arguments are passed to `xarray.open_dataset`.
+    """
+    import xarray as xr
+    
+    os.makedirs(INDEX_PATH, exist_ok=True)
+    return xr.open_dataset(
+        gribname,
+        engine="cfgrib",
+        backend_kwargs={
+            "indexpath": os.path.join(INDEX_PATH, os.path.basename(gribname) + '.idx')
+        },
+        **kwargs,
+    )
+
 def get_data(gribname, valtimes, varidx = -1):
     """Extract an Numpy array of data from the GRIB name.
     
@@ -361,13 +393,7 @@ def get_data(gribname, valtimes, varidx = -1):
         Numpy array with the data contained in the GRIB file at the requested
         validity times. 
     """
-    grib = xr.open_dataset(
-        gribname,
-        engine="cfgrib",
-        backend_kwargs={
-            "indexpath": os.path.join(INDEX_PATH, os.path.basename(gribname) + '.idx')
-        }
-    )
+    grib = open_dataset(gribname)
     varname = [_ for _ in grib.variables][varidx]
     
     if gribname.endswith("FC3hr"):
@@ -379,13 +405,141 @@ def get_data(gribname, valtimes, varidx = -1):
     
     return x
 
+def index_grib_messages(gribname):
+    """Locate the messages of a GRIB file, without decoding their values.
+    
+    The file is read once and each message is identified by its base time
+    and its lead time (end step, in hours). Only the headers are loaded, not
+    the data sections. The returned index is then used with `read_grib_message`
+    to decode a single message.
+    
+    
+    Parameters
+    ----------
+    gribname: str
+        Path to the GRIB file
+    
+    
+    Returns
+    -------
+    index: dict
+        Keys are the tuples (basetime, step) with `basetime` a `datetime.datetime`
+        and `step` an int. Values are the tuples (offset, size) in bytes of the message.
+    
+    
+    Example
+    -------
+    >>> index = index_grib_messages("MERA_PRODYEAR_2017_01_61_105_0_4_FC3hr")
+    >>> index[(dt.datetime(2017, 1, 16, 0), 3)]
+    (1581120, 521940)
+    """
+    import eccodes as ecc
+
+    index = {}
+    with open(gribname, "rb") as f:
+        while True:
+            gid = ecc.codes_grib_new_from_file(f, headers_only=True)
+            if gid is None:
+                break
+            
+            basetime = dt.datetime.strptime(
+                ecc.codes_get_string(gid, "dataDate") + ecc.codes_get_string(gid, "dataTime").zfill(4),
+                "%Y%m%d%H%M",
+            )
+            step = ecc.codes_get(gid, "endStep", int)
+            index[(basetime, step)] = (
+                ecc.codes_get_message_offset(gid),
+                ecc.codes_get(gid, "totalLength", int),
+            )
+            ecc.codes_release(gid)
+    
+    return index
+
+def read_grib_message(gribname, offset, size):
+    """Decode the values of a single message of a GRIB file.
+    
+    Only the bytes of the message are read (see `index_grib_messages` to
+    get the offset and size of the message).
+    
+    
+    Returns
+    -------
+    x: ndarray of shape (n_y, n_x)
+        Values of the message. Missing values are set to NaN.
+    """
+    import eccodes as ecc
+
+    with open(gribname, "rb") as f:
+        f.seek(offset)
+        gid = ecc.codes_new_from_message(f.read(size))
+    
+    try:
+        x = _get_message_values(gid)
+    finally:
+        ecc.codes_release(gid)
+    
+    return x
+
+def _get_message_values(gid):
+    """Values of an eccodes GRIB handle, as a float32 array of shape (n_y, n_x) with NaN for missing values"""
+    import eccodes as ecc
+
+    x = ecc.codes_get_values(gid)
+    if ecc.codes_get(gid, "bitmapPresent"):
+        x[x == ecc.codes_get(gid, "missingValue")] = np.nan
+    
+    x = x.reshape(ecc.codes_get(gid, "Ny"), ecc.codes_get(gid, "Nx"))
+    return x.astype(np.float32)
+
 def get_grib1id_from_gribname(gribname):
     """Extract the tuple (IOP, ITL, LEV, TRI) from the GRIB name."""
     gribname = os.path.basename(gribname)
-    _, _, _, _, iop, itl, lev, tri, _ = gribname.split("_")
+    _, iop, itl, lev, tri, _ = gribname.rsplit("_", 5)
     
     return iop, itl, lev, tri
 
+def get_mera_gribname_template(varname, stream = "ANALYSIS", pathfromroot = False):
+    """Return the name of the MERA GRIB file corresponding to the given variable,
+    with the date left as a format field (`basetime`).
+    
+    All the parts depending on the variable are resolved once, so that the
+    GRIB names for many base times are obtained with a single `str.format`.
+    See `get_mera_gribname` for the parameters.
+    
+    
+    Examples
+    --------
+    >>> import datetime as dt
+    >>> get_mera_gribname_template("air_pressure_at_sea_level")
+    "MERA_PRODYEAR_{basetime:%Y}_{basetime:%m}_1_103_0_0_ANALYSIS"
+    
+    >>> get_mera_gribname_template("air_pressure_at_sea_level").format(basetime=dt.datetime(2017, 10, 16, 18))
+    "MERA_PRODYEAR_2017_10_1_103_0_0_ANALYSIS"
+    """
+    if not isinstance(varname, str):
+        varname = tuple(varname)
+    
+    return _get_mera_gribname_template(varname, stream, pathfromroot)
+
+@functools.lru_cache(maxsize=None)
+def _get_mera_gribname_template(varname, stream, pathfromroot):
+    """Cached body of `get_mera_gribname_template` (`varname` must be hashable)"""
+    if isinstance(varname, str):
+        iop, itl, lev, tri = get_grib1id_from_cfname(varname)
+    else:
+        iop, itl, lev, tri = varname
+    
+    template = f"MERA_PRODYEAR_{{basetime:%Y}}_{{basetime:%m}}_{iop}_{itl}_{lev}_{tri}_{stream}"
+    if pathfromroot:
+        template = os.path.join(_get_mera_directory(iop, itl, lev, tri), template)
+    
+    return template
+
+@functools.lru_cache(maxsize=None)
+def _get_mera_directory(iop, itl, lev, tri):
+    """Directory of the GRIB files of a variable, from the MERA root directory"""
+    return os.path.join(*[str(s) for s in ("mera", iop, itl, lev, tri)])
+
 def get_mera_gribname(varname, basetime, stream = "ANALYSIS", pathfromroot = False):
     """Return the name of the MERA GRIB file corresponding to the given variable
     
@@ -423,22 +577,51 @@ def get_mera_gribname(varname, basetime, stream = "ANALYSIS", pathfromroot = Fal
     >>> get_mera_gribname("air_pressure_at_sea_level", dt.datetime(2017, 10, 16, 18), pathfromroot = True)
     "mera/1/103/0/0/MERA_PRODYEAR_2017_10_1_103_0_0_ANALYSIS"
     """
+    return get_mera_gribname_template(varname, stream, pathfromroot).format(basetime=basetime)
+
+def get_mera_gribname_valtime_template(varname, pathfromroot = False):
+    """Same as `get_mera_gribname_template` with the preprocessing of
+    `get_mera_gribname_valtime` to deal with cumulative variables.
+    
+    
+    Returns
+    -------
+    template: str
+        GRIB name with the `basetime` format field
+    
+    timeshift: `datetime.timedelta`
+        Time to remove to the validity time to get the base time
+    
+    
+    Examples
+    --------
+    >>> import datetime as dt
+    >>> template, timeshift = get_mera_gribname_valtime_template("precipitation_amount")
+    >>> template.format(basetime=dt.datetime(2017, 1, 1, 0) - timeshift)
+    "MERA_PRODYEAR_2016_12_1_61_0_4_FC3hr"
+    """
+    if not isinstance(varname, str):
+        varname = tuple(varname)
+    
+    return _get_mera_gribname_valtime_template(varname, pathfromroot)
+
+@functools.lru_cache(maxsize=None)
+def _get_mera_gribname_valtime_template(varname, pathfromroot):
+    """Cached body of `get_mera_gribname_valtime_template` (`varname` must be hashable)"""
     if isinstance(varname, str):
         iop, itl, lev, tri = get_grib1id_from_cfname(varname)
     else:
         iop, itl, lev, tri = varname
     
-    gribname = "_".join(
-        [
-            str(s) for s in [
-                "MERA", "PRODYEAR", basetime.year, str(basetime.month).zfill(2), iop, itl, lev, tri, stream
-            ]
-        ]
-    )
-    if pathfromroot:
-        gribname = os.path.join(*[str(s) for s in ("mera", iop, itl, lev, tri)], gribname)
+    if tri == 4:
+        # Cumulated variable
+        timeshift = utils.str_to_timedelta("3h")
+        stream = "FC3hr"
+    else:
+        timeshift = dt.timedelta(0)
+        stream = "ANALYSIS"
     
-    return gribname
+    return get_mera_gribname_template(varname, stream = stream, pathfromroot=pathfromroot), timeshift
 
 def get_mera_gribname_valtime(varname, valtime, pathfromroot = False):
     """Same as `get_mera_gribname` with a preprocessing to deal cumulative
@@ -459,21 +642,8 @@ def get_mera_gribname_valtime(varname, valtime, pathfromroot = False):
     >>> get_mera_gribname_valtime("precipitation_amount", dt.datetime(2017, 1, 1, 0))
     "MERA_PRODYEAR_2016_12_1_61_0_4_FC3hr"
     """
-    
-    if isinstance(varname, str):
-        iop, itl, lev, tri = get_grib1id_from_cfname(varname)
-    else:
-        iop, itl, lev, tri = varname
-    
-    if tri == 4:
-        # Cumulated variable
-        basetime = valtime - utils.str_to_timedelta("3h")
-        stream = "FC3hr"
-    else:
-        basetime = valtime
-        stream = "ANALYSIS"
-    
-    return get_mera_gribname(varname, basetime, stream = stream, pathfromroot=pathfromroot)
+    template, timeshift = get_mera_gribname_valtime_template(varname, pathfromroot=pathfromroot)
+    return template.format(basetime=valtime - timeshift)
 
 def expand_pathfromroot(gribname):
     """Returns the path from the MERA root directory (i.e. the mount point for the reaext* drives)
@@ -486,19 +656,28 @@ def expand_pathfromroot(gribname):
     """
     gribname = os.path.basename(gribname)
     iop, itl, lev, tri = get_grib1id_from_gribname(gribname)
-    return os.path.join(*[str(s) for s in ("mera", iop, itl, lev, tri)], gribname)
+    return os.path.join(_get_mera_directory(iop, itl, lev, tri), gribname)
 
 def get_all_mera_gribnames(varnames, valtimes, streams = ["ANALYSIS"], pathfromroot = False):
-    """Wrap-up the function get_mera_gribname in a loop"""
-    gribnames = []
+    """Wrap-up the function get_mera_gribname in a loop
+    
+    MERA files are monthly: the names are formatted once per month found in
+    `valtimes`, from a template resolved once per variable and stream.
+    """
+    months = [
+        dt.datetime(year, month, 1)
+        for year, month in sorted(set((valtime.year, valtime.month) for valtime in valtimes))
+    ]
+    
+    gribnames = set()
     for varname in varnames:
-        for valtime in valtimes:
-            for stream in streams:
-                gribnames.append(get_mera_gribname(varname, valtime, stream, pathfromroot=pathfromroot))
-            
+        for stream in streams:
+            template = get_mera_gribname_template(varname, stream, pathfromroot=pathfromroot)
+            gribnames.update(template.format(basetime=month) for month in months)
         
-    return np.unique(gribnames)
+    return sorted(gribnames)
 
+@functools.lru_cache(maxsize=None)
 def get_filesystem_host_and_root(fsname):
     """Return the host name and the root path of the file system `fsname`
     
@@ -551,19 +730,15 @@ def get_filesystem_host_and_root(fsname):
     return hostname, meraroot
 
 def _get_lonlat_grid_epygram(gribname):
+    import epygram
+
     grib = epygram.formats.resource(gribname, "r")
     hg = grib.listfields()[0]
     fd = grib.readfield(hg)
     return fd.geometry.get_lonlat_grid()
 
 def _get_lonlat_grid_xarray(gribname):
-    grib = xr.open_dataset(
-        gribname,
-        engine="cfgrib",
-        backend_kwargs={
-            "indexpath": os.path.join(INDEX_PATH, os.path.basename(gribname) + '.idx')
-        }
-    )
+    grib = open_dataset(gribname)
     return grib.longitude.values, grib.latitude.values
 
 def get_lonlat_grid(gribname, reader = "any"):
@@ -585,8 +760,7 @@ def get_mera_crs(fmt = "proj4"):
     meregeomfile = os.path.join(
         PACKAGE_DIRECTORY, "mera_explorer", "data", "mera-grid-geometry.yaml"
     )
-    with open(meregeomfile, "r") as f:
-        geom = yaml.safe_load(f)
+    geom = _load_yaml(meregeomfile)
     
     g = easydict.EasyDict(geom["geometry"])
     
@@ -654,19 +828,68 @@ def list_mera_gribnames(fsname, keep = None):
     
     return merafilenames
 
+def _index_mera_gribnames(fsname):
+    """Index the MERA GRIB files of `fsname` by their (IOP, ITL, LEV, TRI, stream).
+    
+    All the tuple items are strings, as in the file names. The ".bz2" suffix is
+    not part of the stream, so compressed and uncompressed files share the same key.
+    The file system listings are parsed only once (see `_index_mera_gribnames_in_fs`),
+    while directories are walked at each call as their content can change.
+    """
+    if os.path.isdir(fsname):
+        return _build_mera_gribnames_index(list_mera_gribnames(fsname))
+    else:
+        return _index_mera_gribnames_in_fs(fsname)
+
+@functools.lru_cache(maxsize=8)
+def _index_mera_gribnames_in_fs(fsname):
+    """Cached `_index_mera_gribnames` for the file systems listed in text files"""
+    return _build_mera_gribnames_index(list_mera_gribnames(fsname))
+
+def _build_mera_gribnames_index(merafilenames):
+    index = {}
+    for gribname in merafilenames:
+        parts = gribname.split("_")
+        if len(parts) != 9:
+            continue
+        
+        key = (*parts[4:8], parts[8].removesuffix(".bz2"))
+        index.setdefault(key, []).append(gribname)
+    
+    return index
+
 def read_multimessage_grib(gribname):
-    grib = epygram.formats.resource(gribname, "r")
+    """Read all the messages of a GRIB file (one per variable).
+    
+    The messages are decoded directly with eccodes: only the values are
+    read, the geometry (coordinates) of each field is not built.
+    
+    
+    Returns
+    -------
+    data: OrderedDict
+        Keys are the CF names of the variables, in the order of the messages.
+        Values are the arrays of shape (n_y, n_x) (see `read_grib_message`)
+    """
+    import eccodes as ecc
+
     data = OrderedDict()
-    for hg in grib.listfields():
-        cfname = get_cfname_from_grib1id(
-            hg['indicatorOfParameter'],
-            hg['indicatorOfTypeOfLevel'],
-            hg['level'],
-        )
-        fd = grib.readfield(hg)
-        data[cfname] = fd.getdata()
+    with open(gribname, "rb") as f:
+        while True:
+            gid = ecc.codes_grib_new_from_file(f)
+            if gid is None:
+                break
+            
+            try:
+                cfname = get_cfname_from_grib1id(
+                    ecc.codes_get(gid, "indicatorOfParameter", int),
+                    ecc.codes_get(gid, "indicatorOfTypeOfLevel", int),
+                    ecc.codes_get(gid, "level", int),
+                )
+                data[cfname] = _get_message_values(gid)
+            finally:
+                ecc.codes_release(gid)
     
-    grib.close()
     return data
 
 def read_variables_from_yaml(yaml_file):
@@ -703,8 +926,7 @@ def read_variables_from_yaml(yaml_file):
     >>> cfnames
     ['air_pressure_at_sea_level', 'air_temperature_at_2_metres', 'air_temperature_at_10_metres']
     """
-    with open(yaml_file, "r") as f:
-        yf = yaml.safe_load(f)
+    yf = _load_yaml(yaml_file)
     
     cfnames = []
     for v in yf["variables"]:
@@ -718,6 +940,20 @@ def read_variables_from_yaml(yaml_file):
         
     return cfnames
 
+def _load_yaml(yaml_file):
+    """Content of a YAML file, parsed only once as long as the file is not modified
+    
+    The returned structure is shared between calls: it must not be modified.
+    """
+    st = os.stat(yaml_file)
+    return _load_yaml_cached(os.path.abspath(yaml_file), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=32)
+def _load_yaml_cached(yaml_file, mtime_ns, size):
+    """Cached body of `_load_yaml` (`mtime_ns` and `size` are only part of the cache key)"""
+    with open(yaml_file, "r") as f:
+        return yaml.load(f, Loader=YamlLoader)
+
 def write_variables_to_yaml(cfnames, yaml_file):
     """Write the set of variables into a yaml file.
     
@@ -739,12 +975,15 @@ def write_variables_to_yaml(cfnames, yaml_file):
     sh> cat test.yaml
     variables:
       air_pressure_at_sea_level: {}
-      air_temperature_at_10_metres: {}
       air_temperature_at_2_metres: {}
+      air_temperature_at_10_metres: {}
+    
+    The variables are written in the order of `cfnames`, so that
+    `read_variables_from_yaml` returns them in the same order.
     """
     yaml_vars = {"variables":{v:{} for v in cfnames}}
     with open(yaml_file, 'w') as yf:
-        yaml.dump(yaml_vars, yf)
+        yaml.dump(yaml_vars, yf, Dumper=YamlDumper, sort_keys=False)
     
 def subset_present_variables(cfnames, fsname):
     """Return the subset of variables from `cfnames` that are found in the file system `fsname`
@@ -771,18 +1010,13 @@ def subset_present_variables(cfnames, fsname):
     >>> herevarnames = subset_present_variables(cfnames, "reaext03")
     ['air_pressure_at_sea_level', 'air_temperature_at_2_metres']
     """
-    merafilenames = list_mera_gribnames(fsname)
-    
-    iop_itl_lev_tri = [
-        "_".join([str(d) for d in get_grib1id_from_cfname(cfname)])
-        for cfname in cfnames
-    ]
+    present_grib1ids = set(key[:4] for key in _index_mera_gribnames(fsname))
     
     herevarnames = []
-    for varcode, varname in zip(iop_itl_lev_tri, cfnames):
-        n_files_here = len([fn for fn in merafilenames if varcode in fn])
+    for varname in cfnames:
+        grib1id = tuple(str(d) for d in get_grib1id_from_cfname(varname))
         
-        if n_files_here > 0:
+        if grib1id in present_grib1ids:
             herevarnames.append(varname)
         
     return herevarnames
@@ -916,39 +1150,102 @@ def get_all_present_gribnames(cfnames, fsname, exclude_bz2 = True, stream = "ANA
      'MERA_PRODYEAR_2017_10_11_105_2_0_ANALYSIS',
      'MERA_PRODYEAR_2017_11_11_105_2_0_ANALYSIS']
     """
-    
-    iop_itl_lev_tri = [
-        "_".join([str(d) for d in get_grib1id_from_cfname(cfname)] + [stream])
+    index = _index_mera_gribnames(fsname)
+    keys = dict.fromkeys(
+        tuple(str(d) for d in get_grib1id_from_cfname(cfname)) + (stream,)
         for cfname in cfnames
-    ]
-    
-    if exclude_bz2:
-        keep_crit = lambda l: l.startswith("MERA") and any([vc in l for vc in iop_itl_lev_tri]) and not l.endswith(".bz2")
-    else:
-        keep_crit = lambda l: l.startswith("MERA") and any([vc in l for vc in iop_itl_lev_tri])
+    )
     
+    heregribnames = []
+    for key in keys:
+        for gribname in index.get(key, []):
+            if not (exclude_bz2 and gribname.endswith(".bz2")):
+                heregribnames.append(gribname)
     
-    return list_mera_gribnames(fsname, keep = keep_crit)
+    return heregribnames
 
 def uncompress_bz2(bz2file):
-    """Uncompress a bz2 file at the same location with the same name (without the .bz2 suffix)"""
-    with bz2.BZ2File(bz2file) as fr, open(bz2file[:-4], "wb") as fw:
-        shutil.copyfileobj(fr,fw)
+    """Uncompress a bz2 file at the same location with the same name (without the .bz2 suffix)
     
+    The data is first written in a temporary file, renamed only once complete,
+    so that an interrupted decompression does not leave a truncated GRIB file.
+    """
+    bufsize = 1 << 20
+    outfile = bz2file[:-4]
+    tmpfile = outfile + ".tmp"
+    try:
+        with bz2.BZ2File(bz2file) as fr, open(tmpfile, "wb", buffering=bufsize) as fw:
+            shutil.copyfileobj(fr, fw, bufsize)
+    except BaseException:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+    
+    os.replace(tmpfile, outfile)
     os.remove(bz2file)
     
-    return bz2file[:-4]
+    return outfile
 
-def uncompress_all_bz2(rootdir, verbose = False):
-    """Browse all sub-directories of `rootdir` and uncompress bz2 when they are found"""
-    i = 0
-    for root, dirs, files in os.walk(rootdir):
-        for f in files:
-            if f.endswith(".bz2"):
-                uncompress_bz2(os.path.join(root, f))
-                i += 1
-                if i % 10 == 0:
-                    print(f"[{i} files uncompressed] last one: {f}")
+def _find_bz2_files(rootdir):
+    """Yield the paths of the bz2 files in all sub-directories of `rootdir`
+    
+    As in `os.walk`, the directories that cannot be read are skipped.
+    """
+    try:
+        entries = os.scandir(rootdir)
+    except OSError:
+        return
+    
+    with entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            
+            if is_dir:
+                yield from _find_bz2_files(entry.path)
+            elif entry.name.endswith(".bz2"):
+                yield entry.path
+
+def uncompress_all_bz2(rootdir, verbose = False, n_workers = 1):
+    """Browse all sub-directories of `rootdir` and uncompress bz2 when they are found
+    
+    The decompression is CPU-bound: when `n_workers > 1`, files are
+    uncompressed concurrently in a pool of `n_workers` processes. The
+    directories are browsed while the workers decompress, with at most
+    `2*n_workers` files submitted at a time. If `verbose`, the progress is
+    printed every 10 files.
+    """
+    def report(gribnames):
+        for i, gribname in enumerate(gribnames, 1):
+            if verbose and i % 10 == 0:
+                print(f"[{i} files uncompressed] last one: {os.path.basename(gribname)}.bz2")
+    
+    bz2files = _find_bz2_files(rootdir)
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            report(_submit_bounded(executor, uncompress_bz2, bz2files, 2 * n_workers))
+    else:
+        report(map(uncompress_bz2, bz2files))
+
+def _submit_bounded(executor, func, iterable, max_pending):
+    """Yield the results of `func` on the items of `iterable`, in order of
+    completion, keeping at most `max_pending` tasks in the executor
+    
+    Contrary to `executor.map`, the iterable is consumed lazily.
+    """
+    pending = set()
+    for item in iterable:
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        
+        pending.add(executor.submit(func, item))
+    
+    for future in as_completed(pending):
+        yield future.result()
 
 
 def count_dates_per_month(dates_available, dates_expected = None):
@@ -1032,14 +1329,21 @@ def count_dates_per_month(dates_available, dates_expected = None):
     
     msg += "     |" + " ".join([str(m).ljust(5) for m in months]) + "\n"
     msg += "-----+" + "-".join(["-----" for m in months]) + "\n"
-    mcount = np.zeros((years.size, 12), dtype = np.int32)
+    
+    def count(dates):
+        """Number of dates in each (year, month) cell, in a single pass over the dates"""
+        ym = np.fromiter(
+            ((d.year - start.year) * 12 + d.month - 1 for d in dates), dtype = np.int64
+        )
+        ym = ym[(ym >= 0) & (ym < years.size * 12)]
+        return np.bincount(ym, minlength = years.size * 12).reshape((years.size, 12))
+    
+    mcount = count(dates_available)
+    if dates_expected is not None:
+        mcount = mcount - count(dates_expected)
+    
+    mcount = mcount.astype(np.int32)
     for iy, y in enumerate(years):
-        for m in months:
-            if dates_expected is not None:
-                mcount[iy, m-1] = sum([d.year == y and d.month == m for d in dates_available]) - sum([d.year == y and d.month == m for d in dates_expected])
-            else:
-                mcount[iy, m-1] = sum([d.year == y and d.month == m for d in dates_available])
-        
         msg += str(y).ljust(5) + "|" + " ".join(
             [
                 str(mc).ljust(5) for mc in mcount[iy, :]
@@ -6,6 +6,7 @@ General utilities.
 """
 
 import os
+import functools
 import numpy as np
 import datetime as dt
 
@@ -44,6 +45,7 @@ def lineparser(line, startword, stopword=None):
     return line[startidx:endidx]
 
 
+@functools.lru_cache(maxsize=4096)
 def str_to_datetime(strdate):
     """Convert string-formatted date to `datetime.datetime` object
 
@@ -67,6 +69,7 @@ def str_to_datetime(strdate):
     return dt.datetime.strptime(strdate, fmt)
 
 
+@functools.lru_cache(maxsize=4096)
 def str_to_timedelta(strdelta):
     """Convert string-formatted duration to `datetime.timedelta` object
 
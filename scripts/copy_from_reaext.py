@@ -64,6 +64,9 @@ parser.add_argument(
     help="Range of validity dates to transfer (ex: 1991-01_2001-04 transfers all GRIB from Jan. 1991 to Apr. 2001)",
     default="1981-01_2016-12",
 )
+parser.add_argument(
+    "--n-workers", help="Number of processes uncompressing the bz2 files", type=int, default=1
+)
 parser.add_argument("--verbose", help="Trigger verbose mode", action="store_true")
 args = parser.parse_args()
 
@@ -151,4 +154,4 @@ print(
 # Extract the bz2 files
 # ---------------------
 print("Uncompressing bz2...")
-gribs.uncompress_all_bz2(loc_rootdir, verbose=True)
+gribs.uncompress_all_bz2(loc_rootdir, verbose=True, n_workers=args.n_workers)
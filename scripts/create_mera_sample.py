@@ -211,7 +211,7 @@ for subset, anchortimes in anchorsplit.items():
         )
 
         for cfname in cfnames:
-            count = 0
+            x = []
             for val_t in valtimes:
                 gribname = os.path.join(
                     merarootdir,
@@ -221,15 +221,9 @@ for subset, anchortimes in anchorsplit.items():
                     print(f"\t\tMISSING: {cfname} {gribname}")
                     continue
 
-                if count == 0:
-                    x = ss(gribs.get_data(gribname, val_t))
-                else:
-                    x_t = ss(gribs.get_data(gribname, val_t))
-                    x = np.dstack((x, x_t))
+                x.append(ss(gribs.get_data(gribname, val_t)))
 
-                count += 1
-            x = np.swapaxes(x, 0, 2)
-            x = np.swapaxes(x, 1, 2)
+            x = np.stack(x, axis=0)  # (nt, nx, ny)
             print("\t\t", cfname, x.shape, x.min(), x.mean(), x.max())
 
             X.append(x)
@@ -241,7 +235,7 @@ for subset, anchortimes in anchorsplit.items():
 
         # TOA files
         # ---------
-        count = 0
+        x = []
         for val_t in valtimes:
             gribname = os.path.join(
                 merarootdir,
@@ -249,19 +243,10 @@ for subset, anchortimes in anchorsplit.items():
                     toaswf_cfname, val_t, pathfromroot=True
                 ),
             )
-
-            if count == 0:
-                x = ss(gribs.get_data(gribname, val_t))
-            else:
-                x_t = ss(gribs.get_data(gribname, val_t))
-                x = np.dstack((x, x_t))
-
-            count += 1
-
+            x.append(ss(gribs.get_data(gribname, val_t)))
             gribnames.append(gribname)
 
-        x = np.swapaxes(x, 0, 2)
-        x = np.swapaxes(x, 1, 2)
+        x = np.stack(x, axis=0)  # (nt, nx, ny)
         print("\t\t", toaswf_cfname, x.shape, x.min(), x.mean(), x.max())
 
         if writefiles:
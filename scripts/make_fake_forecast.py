@@ -37,6 +37,9 @@ parser.add_argument(
 parser.add_argument(
     "--device", help="Device on which the inference is run ('cpu' or 'cuda')", default="cpu"
 )
+parser.add_argument(
+    "--n-workers", help="Number of threads reading and writing GRIBs during the inference", type=int, default=1
+)
 args = parser.parse_args()
 
 if args.forecaster == "persistence":
@@ -61,4 +64,5 @@ forecasts.forecast_from_analysis_and_forcings(
     max_leadtime=args.max_leadtime,
     textract=args.textract,
     step=args.step,
+    n_workers=args.n_workers,
 )
@@ -25,6 +25,9 @@ parser.add_argument("--max-leadtime", help="Maximum lead time", default="54h")
 parser.add_argument(
     "--textract", help="Frequency of files to be extracted", default="72h"
 )
+parser.add_argument(
+    "--n-workers", help="Number of base times processed in parallel", type=int, default=1
+)
 parser.add_argument(
     "--outdir",
     help="Frequency of files to be extracted",
@@ -39,4 +42,5 @@ forecasts.create_mera_analysis_and_forcings(
     max_leadtime=args.max_leadtime,
     textract=args.textract,
     step=args.step,
+    n_workers=args.n_workers,
 )
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""The Met Eireann ReAnalysis explorer.
+
+Test the look up of MERA GRIB files present in a directory
+"""
+
+import os
+import tempfile
+from mera_explorer import gribs
+
+
+# Set up the test
+# ---------------
+# The GRIB1 id of "air_pressure_at_surface_level" (1_105_0_0) is a substring
+# of the one of the file 71_105_0_0: it must not be taken as present.
+gribnames = [
+    "MERA_PRODYEAR_2017_01_71_105_0_0_ANALYSIS",
+    "MERA_PRODYEAR_2017_01_11_105_2_0_ANALYSIS",
+    "MERA_PRODYEAR_2017_02_11_105_2_0_ANALYSIS.bz2",
+]
+tmpdir = tempfile.mkdtemp()
+for gribname in gribnames:
+    open(os.path.join(tmpdir, gribname), "w").close()
+
+cfnames = ["air_pressure_at_surface_level", "air_temperature_at_2_metres"]
+
+
+# Check the results
+# -----------------
+herevarnames = gribs.subset_present_variables(cfnames, tmpdir)
+print("Present variables:", herevarnames)
+assert herevarnames == ["air_temperature_at_2_metres"], herevarnames
+
+heregribnames = gribs.get_all_present_gribnames(cfnames, tmpdir, exclude_bz2 = True)
+print("Present GRIB files:", heregribnames)
+assert heregribnames == ["MERA_PRODYEAR_2017_01_11_105_2_0_ANALYSIS"], heregribnames
+
+heregribnames = gribs.get_all_present_gribnames(cfnames, tmpdir, exclude_bz2 = False)
+assert sorted(heregribnames) == [
+    "MERA_PRODYEAR_2017_01_11_105_2_0_ANALYSIS",
+    "MERA_PRODYEAR_2017_02_11_105_2_0_ANALYSIS.bz2",
+], heregribnames
+
+print("Done.")
+print(f"Clean up: >>> rm -r {tmpdir}")